@@ -0,0 +1,123 @@
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+from models import CellData
+
+# Campos numéricos usados para medir a "semelhança" entre células
+FEATURE_FIELDS = (
+    "Capacity",
+    "NominalVoltage",
+    "MaxContinuousDischargeRate",
+    "MaxContinuousChargeRate",
+    "Impedance",
+    "Weight",
+    "Cell_Thickness",
+    "Cell_Width",
+    "Cell_Height",
+    "Price",
+    "Cycles",
+)
+FIELD_POS = {name: i for i, name in enumerate(FEATURE_FIELDS)}
+
+
+class CellIndex:
+    """
+    Índice em espaço de features normalizado (z-score) sobre o catálogo.
+    Construído uma vez no reload da base de dados; as queries são uma única
+    operação vetorizada em NumPy, por isso os pesos por campo podem mudar
+    a cada pedido sem reconstruir nada.
+    """
+
+    def __init__(self, cells: List[CellData]):
+        self.cells = cells
+        self.raw = np.array(
+            [[getattr(c, f) for f in FEATURE_FIELDS] for c in cells],
+            dtype=np.float64).reshape(len(cells), len(FEATURE_FIELDS))
+
+        self.mean = self.raw.mean(axis=0) if len(cells) else np.zeros(len(FEATURE_FIELDS))
+        std = self.raw.std(axis=0) if len(cells) else np.ones(len(FEATURE_FIELDS))
+        # Campos constantes não contribuem para a distância
+        self.std = np.where(std > 0, std, 1.0)
+        self.normalized = (self.raw - self.mean) / self.std
+        self.compositions = np.array([c.Composition for c in cells], dtype=object)
+
+        # Lookup por modelo, para não percorrer o catálogo a cada pedido
+        self.by_model: Dict[str, List[int]] = {}
+        for i, c in enumerate(cells):
+            self.by_model.setdefault(c.CellModelNo, []).append(i)
+
+    def find_cell(self, brand: Optional[str], model: str) -> Optional[int]:
+        """Índice da primeira célula com este modelo (e marca, se indicada)."""
+        for i in self.by_model.get(model, []):
+            if brand is None or self.cells[i].Brand == brand:
+                return i
+        return None
+
+    def nearest(
+        self,
+        k: int,
+        reference: Optional[int] = None,
+        target: Optional[Dict[str, float]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        min_values: Optional[Dict[str, float]] = None,
+        max_values: Optional[Dict[str, float]] = None,
+        composition: Optional[str] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Retorna até k pares (índice no catálogo, distância) ordenados pela
+        distância euclidiana ponderada. Campos sem valor de referência nem
+        alvo são ignorados. Lança ValueError para campos desconhecidos.
+        """
+        target = target or {}
+        weights = weights or {}
+        min_values = min_values or {}
+        max_values = max_values or {}
+
+        for field in (*target, *weights, *min_values, *max_values):
+            if field not in FIELD_POS:
+                raise ValueError(f"Campo desconhecido: {field}")
+
+        if not self.cells or k <= 0:
+            return []
+
+        # 1. Ponto de query (em unidades originais) e campos ativos
+        query = np.zeros(len(FEATURE_FIELDS))
+        active = np.zeros(len(FEATURE_FIELDS), dtype=bool)
+        if reference is not None:
+            query[:] = self.raw[reference]
+            active[:] = True
+        for field, value in target.items():
+            query[FIELD_POS[field]] = value
+            active[FIELD_POS[field]] = True
+
+        w = np.ones(len(FEATURE_FIELDS))
+        for field, value in weights.items():
+            w[FIELD_POS[field]] = max(value, 0.0)
+        w = np.where(active, w, 0.0)
+
+        # 2. Filtros rígidos como máscara booleana
+        mask = np.ones(len(self.cells), dtype=bool)
+        for field, value in min_values.items():
+            mask &= self.raw[:, FIELD_POS[field]] >= value
+        for field, value in max_values.items():
+            mask &= self.raw[:, FIELD_POS[field]] <= value
+        if composition is not None:
+            mask &= self.compositions == composition
+        if reference is not None:
+            mask[reference] = False
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        # 3. Distâncias ponderadas e top-k parcial (argpartition é O(n))
+        q = (query - self.mean) / self.std
+        diff = self.normalized[candidates] - q
+        dist = np.sqrt((diff * diff) @ w)
+
+        if k < candidates.size:
+            top = np.argpartition(dist, k)[:k]
+        else:
+            top = np.arange(candidates.size)
+        top = top[np.argsort(dist[top], kind="stable")]
+
+        return [(int(candidates[i]), float(dist[i])) for i in top]
@@ -2,6 +2,7 @@ import json
 import os
 from typing import List, Dict
 from models import CellData, Fuse, Relay, Cable, Bms, Shunt
+from cell_index import CellIndex
 
 # Caminhos para os ficheiros
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,6 +27,7 @@ class Database:
     def __init__(self):
         self.cells: List[CellData] = []
         self.components: Dict[str, List] = {}
+        self.cell_index = CellIndex([])
         self.reload()
 
     def reload(self):
@@ -36,6 +38,8 @@ class Database:
         raw_cells = load_json_file("cells.json")
         # Validação automática com Pydantic
         self.cells = [CellData(**c) for c in raw_cells]
+        # Índice de vizinhos mais próximos para /cells/alternatives
+        self.cell_index = CellIndex(self.cells)
 
         # 2. Carregar Componentes
         raw_comps = load_json_file("components.json")
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+from urllib.parse import urlencode
+
+# Cache em disco (sobrevive a restarts) + LRU em memória para os mais usados
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("DIAGRAM_CACHE_DIR",
+                      os.path.join(BASE_DIR, "cache", "diagrams"))
+MEMORY_CACHE_SIZE = 256
+# Nº máximo de SVGs em disco; os menos usados recentemente são apagados
+try:
+    DIAGRAM_MAX_FILES = int(os.getenv("DIAGRAM_MAX_FILES", 2000))
+except ValueError:
+    print("⚠️ DIAGRAM_MAX_FILES inválido, a usar 2000")
+    DIAGRAM_MAX_FILES = 2000
+
+# --- ESCALA DO DESENHO ---
+CELL_W = 50
+CELL_H = 20
+GAP_X = 20
+GAP_Y = 10
+MARGIN = 40
+LAYOUT_SCALE_MAX = 8.0  # px por mm, limitado para packs pequenos
+LAYOUT_MAX_WIDTH = 800
+LAYOUT_MAX_HEIGHT = 600
+GROUP_COLORS = ("#60a5fa", "#34d399", "#fbbf24", "#f87171", "#a78bfa", "#f472b6")
+
+
+def diagram_key(series: int, parallel: int, nx: int, ny: int, pitch_x: float, pitch_y: float) -> str:
+    """Chave content-addressed: hash do que determina o desenho."""
+    spec = {
+        "s": series,
+        "p": parallel,
+        "layout": [nx, ny],
+        "pitch": [round(pitch_x, 2), round(pitch_y, 2)],
+    }
+    raw = json.dumps(spec, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def render_wiring_svg(series: int, parallel: int, nx: int, ny: int, pitch_x: float, pitch_y: float) -> str:
+    """
+    Desenha o esquema S/P (grupos em paralelo ligados em série) e, por baixo,
+    a disposição física nx x ny das células com a cor do grupo série.
+    O passo (pitch) já inclui o espaçamento e a orientação da célula.
+    """
+    # 1. Esquema elétrico
+    pack_w = series * CELL_W + (series - 1) * GAP_X
+    pack_h = parallel * CELL_H + (parallel - 1) * GAP_Y
+
+    # 2. Layout físico (escala mm -> px)
+    scale = min(LAYOUT_SCALE_MAX,
+                LAYOUT_MAX_WIDTH / max(nx * pitch_x, 1),
+                LAYOUT_MAX_HEIGHT / max(ny * pitch_y, 1))
+    cell_px_w = max(pitch_x * scale, 2)
+    cell_px_h = max(pitch_y * scale, 2)
+    layout_w = nx * cell_px_w
+    layout_h = ny * cell_px_h
+
+    svg_w = int(max(pack_w, layout_w) + 2 * MARGIN)
+    layout_y = MARGIN + pack_h + 2 * MARGIN
+    svg_h = int(layout_y + layout_h + MARGIN)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{svg_w}" height="{svg_h}" '
+        f'viewBox="0 0 {svg_w} {svg_h}" font-family="sans-serif" font-size="10">',
+        f'<text x="{MARGIN}" y="{MARGIN - 15}" font-size="14" font-weight="bold">{series}S{parallel}P</text>',
+    ]
+
+    x0 = MARGIN
+    y0 = MARGIN
+    for s in range(series):
+        gx = x0 + s * (CELL_W + GAP_X)
+        color = GROUP_COLORS[s % len(GROUP_COLORS)]
+        # Barramentos do grupo em paralelo
+        parts.append(f'<line x1="{gx}" y1="{y0}" x2="{gx}" y2="{y0 + pack_h}" stroke="#111" stroke-width="2"/>')
+        parts.append(f'<line x1="{gx + CELL_W}" y1="{y0}" x2="{gx + CELL_W}" y2="{y0 + pack_h}" stroke="#111" stroke-width="2"/>')
+        for p in range(parallel):
+            cy = y0 + p * (CELL_H + GAP_Y)
+            parts.append(f'<rect x="{gx}" y="{cy}" width="{CELL_W}" height="{CELL_H}" fill="{color}" stroke="#111"/>')
+            parts.append(f'<text x="{gx + 3}" y="{cy + 14}">-</text>')
+            parts.append(f'<text x="{gx + CELL_W - 9}" y="{cy + 14}">+</text>')
+        # Ligação série para o grupo seguinte
+        if s < series - 1:
+            link_y = y0 if s % 2 == 0 else y0 + pack_h
+            parts.append(f'<line x1="{gx + CELL_W}" y1="{link_y}" x2="{gx + CELL_W + GAP_X}" y2="{link_y}" stroke="#dc2626" stroke-width="3"/>')
+
+    parts.append(f'<text x="{x0 - 12}" y="{y0 + pack_h / 2 + 4}" font-size="14" font-weight="bold">-</text>')
+    parts.append(f'<text x="{x0 + pack_w + 4}" y="{y0 + pack_h / 2 + 4}" font-size="14" font-weight="bold">+</text>')
+
+    # Layout físico: percurso em serpentina, P células consecutivas por grupo
+    parts.append(f'<text x="{MARGIN}" y="{layout_y - 10}" font-size="12">Layout {nx} x {ny} '
+                 f'({nx * pitch_x:.0f} x {ny * pitch_y:.0f} mm)</text>')
+    for row in range(ny):
+        for col in range(nx):
+            order = row * nx + (col if row % 2 == 0 else nx - 1 - col)
+            group = order // parallel
+            if group >= series:
+                continue
+            rx = MARGIN + col * cell_px_w
+            ry = layout_y + row * cell_px_h
+            color = GROUP_COLORS[group % len(GROUP_COLORS)]
+            parts.append(f'<rect x="{rx:.1f}" y="{ry:.1f}" width="{cell_px_w:.1f}" height="{cell_px_h:.1f}" '
+                         f'fill="{color}" stroke="#111" stroke-width="0.5"><title>S{group + 1}</title></rect>')
+
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+class DiagramCache:
+    """
+    Cache content-addressed dos diagramas. O URL descreve a própria spec
+    (S, P, layout e passo), por isso qualquer processo consegue desenhá-lo,
+    mesmo depois de um restart; o hash só nomeia o ficheiro e o ETag.
+    O SVG é desenhado no primeiro pedido e guardado em disco (limitado a
+    DIAGRAM_MAX_FILES ficheiros) e no LRU em memória.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_items: int = MEMORY_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def url_for(self, series: int, parallel: int, layout) -> str:
+        query = urlencode({
+            "s": series,
+            "p": parallel,
+            "nx": layout.nx,
+            "ny": layout.ny,
+            "px": round(layout.pitch_x, 2),
+            "py": round(layout.pitch_y, 2),
+        })
+        return f"/diagrams/wiring.svg?{query}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.svg")
+
+    def _prune_disk(self):
+        """Mantém só os DIAGRAM_MAX_FILES SVGs usados mais recentemente."""
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                 if f.endswith(".svg")]
+        if len(files) <= DIAGRAM_MAX_FILES:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - DIAGRAM_MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Outro worker pode ter apagado primeiro
+
+    def get(self, series: int, parallel: int, nx: int, ny: int, pitch_x: float, pitch_y: float) -> Tuple[str, str]:
+        """Retorna (chave, SVG): memória -> disco -> render."""
+        pitch_x, pitch_y = round(pitch_x, 2), round(pitch_y, 2)
+        key = diagram_key(series, parallel, nx, ny, pitch_x, pitch_y)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return key, self.memory[key]
+
+        path = self._path(key)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                svg = f.read()
+            try:
+                # Atualiza o mtime para a limpeza apagar primeiro os menos usados
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            svg = render_wiring_svg(series, parallel, nx, ny, pitch_x, pitch_y)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(svg)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Não foi possível gravar o diagrama em disco: {e}")
+            else:
+                try:
+                    self._prune_disk()
+                except OSError as e:
+                    print(f"⚠️ Não foi possível limpar diagramas antigos: {e}")
+
+        with self.lock:
+            self.memory[key] = svg
+            self.memory.move_to_end(key)
+            if len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+        return key, svg
+
+
+# Instância global partilhada pelo cálculo e pelo endpoint
+diagram_cache = DiagramCache()
@@ -1,7 +1,9 @@
 import math
 # Removemos o lru_cache para evitar erros de "unhashable type: dict"
 from typing import List, Dict, Optional, Tuple, Any
-from models import Requirements, CellData, Fuse, Relay, Cable, Bms, Shunt, Configuration, Dimensions, SafetyAssessment
+from diagrams import diagram_cache
+from tolerance import analyse_tolerances
+from models import Requirements, CellData, PackLayout, Fuse, Relay, Cable, Bms, Shunt, Configuration, Dimensions, SafetyAssessment, CompactConfiguration, CompactDesignResponse, ComponentTables
 
 # --- CONSTANTES DE SEGURANÇA E FÍSICA ---
 HEIGHT_MARGIN_MM = 30.0
@@ -15,6 +17,14 @@ MIN_DELTA_T = 1.0
 FUSE_CURRENT_FACTOR = 1.5
 RELAY_VOLTAGE_FACTOR = 1.1
 RELAY_CURRENT_FACTOR = 2.0
+MAX_PACK_CELLS = 200
+
+# Colunas enviadas no plotResults do formato compacto
+PLOT_COLUMNS = ("series_cells", "parallel_cells", "battery_voltage", "battery_capacity",
+                "battery_energy", "battery_weight", "continuous_power", "peak_power",
+                "total_price")
+COMPONENT_TABLES = (("fuse", "fuses"), ("relay", "relays"), ("cable", "cables"),
+                    ("bms", "bms"), ("shunt", "shunts"))
 
 # --- FUNÇÕES AUXILIARES ---
 
@@ -117,8 +127,12 @@ def select_cable_fast(cables_list: List[dict], i_peak: float, v_max: float, t_am
     return None
 
 
-def config_geometry_validation_fast(cell: CellData, series: int, parallel: int, max_x: float, max_y: float) -> bool:
-    """Validação geométrica rápida usando fatorização."""
+def config_geometry_validation_fast(cell: CellData, series: int, parallel: int, max_x: float, max_y: float):
+    """
+    Validação geométrica rápida usando fatorização.
+    Retorna (nx, ny, pitch_x, pitch_y) com o passo de cada célula em mm
+    (inclui espaçamento e orientação), ou False se não couber.
+    """
     total_cells = series * parallel
     e_cell_spacing = cell.Cell_Thickness + SPACING_THICKNESS_MM
     l_cell_spacing = cell.Cell_Width + SPACING_WIDTH_MM
@@ -130,9 +144,9 @@ def config_geometry_validation_fast(cell: CellData, series: int, parallel: int,
     for dim_x, dim_y in dim_ops:
         for nx, ny in factors:
             if (nx * dim_x <= max_x) and (ny * dim_y <= max_y):
-                return (nx, ny)
+                return (nx, ny, dim_x, dim_y)
             if (ny * dim_x <= max_x) and (nx * dim_y <= max_y):
-                return (ny, nx)
+                return (ny, nx, dim_x, dim_y)
     return False
 
 
@@ -250,7 +264,7 @@ def compute_cell_configurations(req: Any, cell_catalogue: List[CellData], compon
 
             for parallel in range(start_p, 5):  # Limite aumentado para teste
 
-                if parallel * series > 200:
+                if parallel * series > MAX_PACK_CELLS:
                     continue
 
                 stats["totalAttempts"] += 1
@@ -388,7 +402,9 @@ def compute_cell_configurations(req: Any, cell_catalogue: List[CellData], compon
                         height=round(cell.Cell_Height, 1)
                     ),
                     safety=safety,
-                    layout=layout,
+                    layout=PackLayout(
+                        nx=layout[0], ny=layout[1],
+                        pitch_x=round(layout[2], 2), pitch_y=round(layout[3], 2)),
                     affiliate_link=""
                 )
                 configs.append(config)
@@ -396,9 +412,88 @@ def compute_cell_configurations(req: Any, cell_catalogue: List[CellData], compon
     configs.sort(key=lambda x: x.total_price /
                  x.battery_energy if x.battery_energy > 0 else 0, reverse=True)
 
-    return {
+    # Só os resultados devolvidos recebem URL (o SVG é desenhado a pedido)
+    for config in configs[:100]:
+        config.wiring_diagram_url = diagram_cache.url_for(
+            config.series_cells, config.parallel_cells, config.layout)
+
+    tolerance = getattr(req, "tolerance", None)
+    if tolerance is not None:
+        analyse_tolerances(configs[:100], tolerance)
+
+    response = {
         "results": configs[:100],
         "plotResults": configs[:100],
         "total": len(configs),
         "stats": stats if req.debug else None
     }
+
+    if getattr(req, "response_format", "full") == "compact":
+        return build_compact_response(response)
+    return response
+
+# --- FORMATO COMPACTO ---
+
+
+def build_compact_response(response: Dict[str, Any]) -> CompactDesignResponse:
+    """
+    Converte a resposta completa no formato normalizado: cada célula e
+    componente é enviado uma vez e as configurações usam o índice na tabela.
+    """
+    cells: List[CellData] = []
+    cell_ids: Dict[int, int] = {}
+    tables: Dict[str, List[Any]] = {name: [] for _, name in COMPONENT_TABLES}
+    table_ids: Dict[str, Dict[Tuple, int]] = {
+        name: {} for _, name in COMPONENT_TABLES}
+
+    def ref_component(name: str, comp: Any) -> Optional[int]:
+        if comp is None:
+            return None
+        # Os componentes são recriados por configuração, por isso comparamos por valor
+        key = tuple(to_dict(comp).values())
+        ids = table_ids[name]
+        if key not in ids:
+            ids[key] = len(tables[name])
+            tables[name].append(comp)
+        return ids[key]
+
+    scalar_fields = [f for f in CompactConfiguration.model_fields
+                     if f != "cell" and f not in dict(COMPONENT_TABLES)]
+    compacted: Dict[int, CompactConfiguration] = {}
+
+    def compact(config: Configuration) -> CompactConfiguration:
+        # results e plotResults partilham as mesmas configurações
+        if id(config) in compacted:
+            return compacted[id(config)]
+
+        # As células vêm da base de dados partilhada, a identidade do objeto basta
+        cell_key = id(config.cell)
+        if cell_key not in cell_ids:
+            cell_ids[cell_key] = len(cells)
+            cells.append(config.cell)
+
+        item = CompactConfiguration.model_construct(
+            cell=cell_ids[cell_key],
+            **{attr: ref_component(name, getattr(config, attr))
+               for attr, name in COMPONENT_TABLES},
+            **{f: getattr(config, f) for f in scalar_fields}
+        )
+        compacted[id(config)] = item
+        return item
+
+    results = [compact(c) for c in response["results"]]
+    plot_compact = [compact(c) for c in response["plotResults"]]
+
+    plot_columns: Dict[str, List[Any]] = {
+        "cell": [c.cell for c in plot_compact]}
+    for col in PLOT_COLUMNS:
+        plot_columns[col] = [getattr(c, col) for c in plot_compact]
+
+    return CompactDesignResponse(
+        cells=cells,
+        components=ComponentTables(**tables),
+        results=results,
+        plotResults=plot_columns,
+        total=response["total"],
+        stats=response["stats"]
+    )
@@ -1,21 +1,24 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional, Union
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 import os
+import secrets
 from dotenv import load_dotenv
 import resend
 
 # Importar Modelos (Inputs/Outputs)
-from models import Requirements, ContactRequest, DesignResponse, CellData
+from models import Requirements, ContactRequest, DesignResponse, CompactDesignResponse, CellData, AlternativeCellsQuery, CellMatch
 
 # Importar Lógica de Cálculo
-from logic import compute_cell_configurations
+from logic import compute_cell_configurations, MAX_PACK_CELLS
+from profiling import run_profiled, attach_profile, should_sample
 
 # --- A GRANDE MUDANÇA ESTÁ AQUI ---
 # Em vez de importar listas, importamos a nossa "Base de Dados" viva
 from database import db
+from diagrams import diagram_cache, diagram_key
 
 app = FastAPI(title="BatteryApp Calculator API")
 
@@ -61,9 +64,65 @@ def get_all_cells():
     return db.cells
 
 
-@app.post("/calculate", response_model=DesignResponse)
-def calculate_endpoint(req: Requirements):
+@app.post("/cells/alternatives", response_model=List[CellMatch])
+def find_alternative_cells(query: AlternativeCellsQuery):
+    """
+    Pesquisa k-vizinhos mais próximos no catálogo ("células como esta mas
+    mais baratas/leves"), com filtros rígidos e pesos por campo.
+    """
+    index = db.cell_index
+
+    reference = query.cell_index
+    if reference is None and query.cell_model is not None:
+        reference = index.find_cell(query.brand, query.cell_model)
+        if reference is None:
+            raise HTTPException(status_code=404, detail="Célula não encontrada")
+    if reference is not None and not 0 <= reference < len(index.cells):
+        raise HTTPException(status_code=404, detail="Célula não encontrada")
+    if reference is None and not query.target:
+        raise HTTPException(
+            status_code=400, detail="Indica uma célula de referência ou valores alvo")
+
+    try:
+        matches = index.nearest(
+            query.k,
+            reference=reference,
+            target=query.target,
+            weights=query.weights,
+            min_values=query.min_values,
+            max_values=query.max_values,
+            composition=query.composition
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return [CellMatch(index=i, distance=round(d, 4), cell=index.cells[i]) for i, d in matches]
+
+
+@app.post("/calculate", response_model=Union[DesignResponse, CompactDesignResponse])
+def calculate_endpoint(req: Requirements, x_admin_token: Optional[str] = Header(None)):
+    # Profiling a pedido: só para admins (token definido em ADMIN_TOKEN)
+    if req.profile is not None:
+        admin_token = os.getenv("ADMIN_TOKEN")
+        if not admin_token or not x_admin_token or not secrets.compare_digest(
+                x_admin_token.encode("utf-8"), admin_token.encode("utf-8")):
+            raise HTTPException(status_code=403, detail="Profiling requer token de admin")
+
     try:
+        if req.profile is not None:
+            res, report = run_profiled(
+                req.profile, compute_cell_configurations, req, db.cells, db.components)
+            return attach_profile(res, report)
+
+        # Amostragem contínua em produção: uma fração pequena dos pedidos
+        # é perfilada e gravada em disco, sem alterar a resposta
+        if should_sample():
+            res, report = run_profiled(
+                "sampling", compute_cell_configurations, req, db.cells, db.components)
+            print(
+                f"📈 Perfil amostrado: {report['profile_file']} ({report['wall_time_ms']} ms)")
+            return res
+
         res = compute_cell_configurations(
             req,
             db.cells,
@@ -79,6 +138,41 @@ def calculate_endpoint(req: Requirements):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/diagrams/wiring.svg")
+def get_wiring_diagram(
+    s: int = Query(..., ge=1, le=MAX_PACK_CELLS),
+    p: int = Query(..., ge=1, le=MAX_PACK_CELLS),
+    nx: int = Query(..., ge=1, le=MAX_PACK_CELLS),
+    ny: int = Query(..., ge=1, le=MAX_PACK_CELLS),
+    px: float = Query(..., gt=0, le=1000),
+    py: float = Query(..., gt=0, le=1000),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Serve o diagrama S/P gerado no servidor. O URL descreve S, P, layout e
+    passo das células, por isso o conteúdo nunca muda e pode ser cacheado
+    para sempre.
+    """
+    if s * p > MAX_PACK_CELLS or nx * ny != s * p:
+        raise HTTPException(status_code=400, detail="Layout inválido para este pack")
+
+    key = diagram_key(s, p, nx, ny, px, py)
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{key}"'
+    }
+
+    # Revalidação: o conteúdo de uma chave nunca muda, não é preciso desenhar
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if "*" in tags or f'"{key}"' in tags:
+            return Response(status_code=304, headers=headers)
+
+    _, svg = diagram_cache.get(s, p, nx, ny, px, py)
+
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
+
+
 # --- Endpoint Bónus: Recarregar Dados sem desligar o servidor ---
 
 
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Literal, Optional, Union
 # --- Component Models (minúsculas, como no teu Deno) ---
 
 
@@ -100,6 +100,15 @@ class CellData(BaseModel):
 # --- Input & Output Structures ---
 
 
+class ToleranceOptions(BaseModel):
+    # Análise Monte Carlo da dispersão entre células (desvio padrão relativo)
+    # Limitado também por tolerance.MAX_CELL_DRAWS em packs grandes
+    samples: int = Field(1000, ge=10, le=5000)
+    capacity_spread: float = Field(0.02, ge=0, le=0.5)
+    impedance_spread: float = Field(0.05, ge=0, le=0.5)
+    seed: Optional[int] = None
+
+
 class Requirements(BaseModel):
     # O frontend pode enviar strings ou números, o Pydantic converte
     min_voltage: float = 70
@@ -114,6 +123,12 @@ class Requirements(BaseModel):
     ambient_temp: float = 25.0
     debug: bool = False
     include_components: bool = True
+    # "full" mantém o formato antigo; "compact" devolve CompactDesignResponse
+    response_format: Literal["full", "compact"] = "full"
+    # Corre este cálculo sob um profiler (requer header X-Admin-Token)
+    profile: Optional[Literal["deterministic", "sampling"]] = None
+    # Bandas de tolerância Monte Carlo para as configurações devolvidas
+    tolerance: Optional[ToleranceOptions] = None
 
 
 class Dimensions(BaseModel):
@@ -128,6 +143,28 @@ class SafetyAssessment(BaseModel):
     warnings: List[str]  # Ex: "Current implies high heat generation"
     recommendations: List[str]  # Ex: "Use Active Cooling"
 
+
+class PercentileBand(BaseModel):
+    p5: float
+    p50: float
+    p95: float
+
+
+class ToleranceBands(BaseModel):
+    samples: int
+    # Corrente máxima de uma célula acima da partilha ideal no grupo P
+    current_imbalance_pct: PercentileBand
+    weakest_group_capacity_ah: PercentileBand
+    usable_energy_wh: PercentileBand
+
+
+class PackLayout(BaseModel):
+    nx: int
+    ny: int
+    # Passo de cada célula em mm (inclui espaçamento e orientação)
+    pitch_x: float
+    pitch_y: float
+
 # Esta estrutura espelha exatamente a interface Configuration do TypeScript
 
 
@@ -153,6 +190,9 @@ class Configuration(BaseModel):
     dimensions: Dimensions
     affiliate_link: str
     safety: SafetyAssessment  # Novo campo
+    # Disposição física encontrada na validação geométrica
+    layout: Optional[PackLayout] = None
+    tolerance: Optional[ToleranceBands] = None
     # Link para imagem gerada ou estática
     wiring_diagram_url: Optional[str] = None
 
@@ -162,3 +202,62 @@ class DesignResponse(BaseModel):
     plotResults: List[Configuration]
     total: int
     stats: Optional[dict] = None
+    profile: Optional[dict] = None
+
+
+# --- Pesquisa de células alternativas (vizinhos mais próximos) ---
+
+
+class AlternativeCellsQuery(BaseModel):
+    # Célula de referência: índice na lista de /cells ou modelo (+ marca)
+    cell_index: Optional[int] = None
+    cell_model: Optional[str] = None
+    brand: Optional[str] = None
+    # Valores alvo por campo (ex: {"Price": 10}); sobrepõem-se à referência
+    target: Dict[str, float] = {}
+    # Peso de cada campo na distância (default 1)
+    weights: Dict[str, float] = {}
+    # Filtros rígidos por campo
+    min_values: Dict[str, float] = {}
+    max_values: Dict[str, float] = {}
+    composition: Optional[str] = None
+    k: int = Field(10, ge=1, le=100)
+
+
+class CellMatch(BaseModel):
+    index: int
+    distance: float
+    cell: CellData
+
+# --- Formato compacto (opt-in via Requirements.response_format) ---
+# Cada célula/componente aparece uma única vez nas tabelas de lookup e as
+# configurações referem-se a eles pelo índice na respetiva lista.
+
+
+class CompactConfiguration(Configuration):
+    # Mesmos campos que Configuration; só as referências passam a índices
+    cell: int
+    fuse: Optional[int]
+    relay: Optional[int]
+    cable: Optional[int]
+    bms: Optional[int]
+    shunt: Optional[int]
+
+
+class ComponentTables(BaseModel):
+    fuses: List[Fuse] = []
+    relays: List[Relay] = []
+    cables: List[Cable] = []
+    bms: List[Bms] = []
+    shunts: List[Shunt] = []
+
+
+class CompactDesignResponse(BaseModel):
+    cells: List[CellData]
+    components: ComponentTables
+    results: List[CompactConfiguration]
+    # Séries para o gráfico em formato colunar: {campo: [valor por config]}
+    plotResults: Dict[str, List[Union[int, float]]]
+    total: int
+    stats: Optional[dict] = None
+    profile: Optional[dict] = None
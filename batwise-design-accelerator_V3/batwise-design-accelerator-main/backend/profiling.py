@@ -0,0 +1,187 @@
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Perfis gravados em disco (mesma pasta de cache dos diagramas)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "cache", "profiles"))
+SAMPLE_INTERVAL_S = 0.001
+PROFILE_EXTENSIONS = (".pstats", ".folded")
+
+
+def _env_number(name: str, default, cast):
+    """Lê uma variável de ambiente numérica; valores inválidos usam o default."""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        print(f"⚠️ {name} inválido ({raw!r}), a usar {default}")
+        return default
+
+
+# Fração de pedidos normais perfilados em produção (0 = desligado)
+PROFILE_SAMPLE_RATE = _env_number("PROFILE_SAMPLE_RATE", 0.0, float)
+# Nº máximo de perfis guardados; os mais antigos são apagados
+PROFILE_MAX_FILES = _env_number("PROFILE_MAX_FILES", 200, int)
+
+# Funções do caminho de cálculo cujas chamadas queremos contar
+TRACKED_FUNCTIONS = (
+    "select_component_fast",
+    "select_bms_fast",
+    "select_cable_fast",
+    "assess_safety",
+    "config_geometry_validation_fast",
+)
+
+
+def should_sample() -> bool:
+    """Decide se este pedido entra na amostragem contínua."""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _prune_profiles():
+    """Mantém só os PROFILE_MAX_FILES perfis mais recentes."""
+    files = [os.path.join(PROFILE_DIR, f) for f in os.listdir(PROFILE_DIR)
+             if f.endswith(PROFILE_EXTENSIONS)]
+    if len(files) <= PROFILE_MAX_FILES:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - PROFILE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Outro worker pode ter apagado primeiro
+
+
+def _save_profile(ext: str, write: Callable[[str], None]) -> Optional[str]:
+    """
+    Grava o perfil em disco (best-effort): uma falha de I/O nunca pode
+    fazer falhar o pedido. Retorna o nome do ficheiro ou None.
+    """
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.{ext}"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        write(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o perfil: {e}")
+        return None
+
+    try:
+        _prune_profiles()
+    except OSError as e:
+        print(f"⚠️ Não foi possível limpar perfis antigos: {e}")
+    return name
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Profiler por amostragem: uma thread lê periodicamente a stack da thread
+    alvo e acumula stacks no formato "collapsed" (a;b;c N), pronto para
+    flamegraph.pl / speedscope. Custo baixo, adequado a produção.
+    """
+
+    def __init__(self, target_thread: int, interval: float = SAMPLE_INTERVAL_S):
+        self.target_thread = target_thread
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _call_counts(stats: pstats.Stats) -> Dict[str, int]:
+    """Número de chamadas das funções rastreadas e de construções Pydantic."""
+    counts = {name: 0 for name in TRACKED_FUNCTIONS}
+    counts["pydantic_model_init"] = 0
+    for (filename, _, func_name), (_, ncalls, *_rest) in stats.stats.items():
+        if func_name in counts and filename.endswith("logic.py"):
+            counts[func_name] += ncalls
+        elif func_name == "__init__" and f"pydantic{os.sep}main.py" in filename:
+            counts["pydantic_model_init"] += ncalls
+    return counts
+
+
+def run_profiled(mode: str, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Executa fn sob o profiler indicado ("deterministic" ou "sampling").
+    Retorna (resultado, relatório); o perfil completo é gravado em disco
+    quando possível (profile_file fica None se a escrita falhar).
+    """
+    start = time.perf_counter()
+
+    if mode == "sampling":
+        with StackSampler(threading.get_ident()) as sampler:
+            result = fn(*args, **kwargs)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        collapsed = sampler.collapsed()
+
+        def write_folded(path: str):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(collapsed)
+
+        report = {
+            "mode": mode,
+            "wall_time_ms": round(wall_ms, 2),
+            "samples": sum(sampler.stacks.values()),
+            "profile_file": _save_profile("folded", write_folded),
+            "collapsed_stacks": collapsed
+        }
+        return result, report
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    # .pstats abre diretamente em snakeviz / flameprof / gprof2dot
+    stats = pstats.Stats(profiler)
+    report = {
+        "mode": "deterministic",
+        "wall_time_ms": round(wall_ms, 2),
+        "call_counts": _call_counts(stats),
+        "profile_file": _save_profile("pstats", profiler.dump_stats)
+    }
+    return result, report
+
+
+def attach_profile(res: Any, report: Optional[Dict[str, Any]]) -> Any:
+    """Junta o relatório à resposta (dict completo ou CompactDesignResponse)."""
+    if isinstance(res, dict):
+        res["profile"] = report
+    else:
+        res.profile = report
+    return res
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Dict, List
+from models import Configuration, ToleranceOptions, ToleranceBands, PercentileBand
+
+PERCENTILES = (5, 50, 95)
+# Limite inferior dos fatores sorteados (evita capacidades/impedâncias <= 0)
+MIN_FACTOR = 1e-3
+# Orçamento de células sorteadas por pedido (amostras x maxS x maxP): acima
+# disto o nº de amostras é reduzido para manter a latência baixa
+MAX_CELL_DRAWS = 1_000_000
+# Células sorteadas por lote, para limitar a memória
+CHUNK_CELL_DRAWS = 100_000
+
+
+def _band(values: np.ndarray, digits: int = 2) -> PercentileBand:
+    p5, p50, p95 = values
+    return PercentileBand(p5=round(float(p5), digits), p50=round(float(p50), digits), p95=round(float(p95), digits))
+
+
+def sample_pack_spread(shapes: np.ndarray, samples: int, opts: ToleranceOptions, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Sorteia `samples` packs de maxS x maxP células com dispersão relativa de
+    capacidade e impedância. Um pack SxP mais pequeno é o canto [:S, :P] do
+    mesmo sorteio, por isso com acumulações ao longo dos eixos S e P obtemos
+    de uma vez as métricas de todas as topologias pedidas em `shapes` (U, 2):
+      - imbalance: corrente máxima de uma célula / corrente ideal (I_grupo / P)
+      - weakest_group: capacidade do grupo P mais fraco / capacidade nominal
+    As amostras são processadas em lotes; os arrays devolvidos são (samples, U).
+    """
+    max_series, max_parallel = (int(v) for v in shapes.max(axis=0))
+    s_idx, p_idx = shapes[:, 0] - 1, shapes[:, 1] - 1
+    n_parallel = np.arange(1, max_parallel + 1)
+    chunk = max(1, CHUNK_CELL_DRAWS // (max_series * max_parallel))
+
+    imbalance, weakest_group = [], []
+    for start in range(0, samples, chunk):
+        shape = (min(chunk, samples - start), max_series, max_parallel)
+        cap = np.maximum(rng.normal(1.0, opts.capacity_spread, shape), MIN_FACTOR)
+        res = np.maximum(rng.normal(1.0, opts.impedance_spread, shape), MIN_FACTOR)
+
+        # Dentro de um grupo em paralelo a corrente divide-se pelas condutâncias
+        conductance = 1.0 / res
+        share = np.maximum.accumulate(conductance, axis=2) / np.cumsum(conductance, axis=2)
+        imbalance.append(np.maximum.accumulate(share * n_parallel, axis=1)[:, s_idx, p_idx])
+
+        # O grupo com menos capacidade limita a energia utilizável do pack
+        group_cap = np.cumsum(cap, axis=2) / n_parallel
+        weakest_group.append(np.minimum.accumulate(group_cap, axis=1)[:, s_idx, p_idx])
+
+    return {"imbalance": np.concatenate(imbalance), "weakest_group": np.concatenate(weakest_group)}
+
+
+def analyse_tolerances(configs: List[Configuration], opts: ToleranceOptions) -> None:
+    """
+    Preenche config.tolerance com bandas de percentis (Monte Carlo).
+    Todos os designs partilham o mesmo sorteio (common random numbers), por
+    isso o custo depende de amostras x maxS x maxP, não do número de designs;
+    esse produto é limitado por MAX_CELL_DRAWS.
+    """
+    if not configs:
+        return
+
+    rng = np.random.default_rng(opts.seed)
+    series = np.array([c.series_cells for c in configs])
+    parallel = np.array([c.parallel_cells for c in configs])
+    samples = min(opts.samples, max(1, MAX_CELL_DRAWS // (int(series.max()) * int(parallel.max()))))
+
+    # Percentis só das topologias usadas: (3, n_topologias)
+    shapes, inverse = np.unique(np.stack([series, parallel], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    rel = sample_pack_spread(shapes, samples, opts, rng)
+    imbalance = np.percentile(rel["imbalance"], PERCENTILES, axis=0)
+    weakest = np.percentile(rel["weakest_group"], PERCENTILES, axis=0)
+
+    # Escala nominal de todos os designs de uma vez: (3, D)
+    capacity = np.array([c.cell.Capacity * 1e-3 * c.parallel_cells for c in configs])
+    voltage = np.array([c.battery_voltage for c in configs])
+    imbalance_pct = (imbalance[:, inverse] - 1.0) * 100
+    weakest_ah = weakest[:, inverse] * capacity
+    usable_wh = weakest_ah * voltage
+
+    for i, config in enumerate(configs):
+        config.tolerance = ToleranceBands(
+            samples=samples,
+            current_imbalance_pct=_band(imbalance_pct[:, i], 1),
+            weakest_group_capacity_ah=_band(weakest_ah[:, i]),
+            usable_energy_wh=_band(usable_wh[:, i], 0)
+        )